@@ -1,27 +1,47 @@
-from fastapi import FastAPI, APIRouter, UploadFile, File, HTTPException, Depends, status
+import time
+BOOT_STARTED = time.perf_counter()  # taken before any other import so cold-start time includes them
+
+from fastapi import FastAPI, APIRouter, UploadFile, File, HTTPException, Depends, Request, Response, BackgroundTasks, status
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from starlette.routing import Match
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 import os
+import sys
+import json
+import threading
+import importlib
+import math
+import re
+from bisect import bisect_right
+import asyncio
 import logging
+from contextlib import contextmanager
+from collections import Counter as StackCounter, OrderedDict, deque
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict, EmailStr
 from typing import List, Optional
 import uuid
 from datetime import datetime, timezone, timedelta
-import bcrypt
 import jwt
-import pdfplumber
 import shutil
-import google.generativeai as genai
+import anyio.to_thread
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(
+    mongo_url,
+    maxPoolSize=int(os.environ.get('MONGO_MAX_POOL_SIZE', '100')),
+    minPoolSize=int(os.environ.get('MONGO_MIN_POOL_SIZE', '0')),
+)
 db = client[os.environ['DB_NAME']]
 
 # JWT Settings
@@ -38,6 +58,296 @@ app = FastAPI()
 api_router = APIRouter(prefix="/api")
 security = HTTPBearer()
 
+# Metrics
+# Prometheus' default buckets stop at 10s; uploads and model calls regularly take longer
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+REQUEST_COUNT = Counter(
+    'http_requests_total', 'HTTP requests handled', ['method', 'endpoint', 'status']
+)
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'HTTP request latency', ['method', 'endpoint', 'status'],
+    buckets=LATENCY_BUCKETS
+)
+STAGE_COUNT = Counter(
+    'stage_calls_total', 'Instrumented stage executions', ['stage', 'status']
+)
+STAGE_LATENCY = Histogram(
+    'stage_duration_seconds', 'Instrumented stage latency', ['stage', 'status'],
+    buckets=LATENCY_BUCKETS
+)
+EVENT_LOOP_LAG = Gauge('event_loop_lag_seconds', 'Delay between scheduled and actual event loop wake-up')
+EXECUTOR_QUEUE_DEPTH = Gauge('executor_queue_depth', 'Tasks waiting for a worker thread')
+EXECUTOR_BUSY_THREADS = Gauge('executor_busy_threads', 'Worker threads currently in use')
+
+LOOP_MONITOR_INTERVAL = float(os.environ.get('LOOP_MONITOR_INTERVAL', '0.5'))
+
+@contextmanager
+def track_stage(stage: str):
+    """Time a block of work and record it under the given stage name."""
+    start = time.perf_counter()
+    outcome = 'ok'
+    try:
+        yield
+    except BaseException:
+        outcome = 'error'
+        raise
+    finally:
+        STAGE_COUNT.labels(stage, outcome).inc()
+        STAGE_LATENCY.labels(stage, outcome).observe(time.perf_counter() - start)
+
+def route_template(request: Request) -> str:
+    # Label by route template (/api/documents/{document_id}) to keep cardinality bounded
+    for route in request.app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return 'unmatched'
+
+async def monitor_event_loop():
+    # Blocking work is sent through anyio.to_thread.run_sync, like Starlette's own sync
+    # handlers, so this one limiter sees all of it
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    while True:
+        expected = time.perf_counter() + LOOP_MONITOR_INTERVAL
+        await asyncio.sleep(LOOP_MONITOR_INTERVAL)
+        EVENT_LOOP_LAG.set(max(0.0, time.perf_counter() - expected))
+        stats = limiter.statistics()
+        EXECUTOR_QUEUE_DEPTH.set(stats.tasks_waiting)
+        EXECUTOR_BUSY_THREADS.set(stats.borrowed_tokens)
+
+# Profiling
+PROFILE_SAMPLE_INTERVAL = float(os.environ.get('PROFILE_SAMPLE_INTERVAL', '0.01'))  # while a session is open
+PROFILE_BACKGROUND_INTERVAL = float(os.environ.get('PROFILE_BACKGROUND_INTERVAL', '0.05'))  # slow-request capture only
+PROFILE_SLOW_REQUEST_SECONDS = float(os.environ.get('PROFILE_SLOW_REQUEST_SECONDS', '0'))  # 0 disables capture
+PROFILE_BUFFER_SECONDS = float(os.environ.get('PROFILE_BUFFER_SECONDS', '60'))
+
+def fold_stacks(stacks: StackCounter) -> str:
+    # Folded format (root;...;leaf) understood by flamegraph.pl and speedscope
+    return '\n'.join(f"{';'.join(reversed(stack))} {count}" for stack, count in stacks.most_common())
+
+class SamplingProfiler:
+    """Samples the stacks of every thread from a daemon thread.
+
+    The sampler only runs while a profiling window is open or slow-request
+    capture is enabled. Samples are process-wide, so a slow-request capture
+    also contains whatever ran concurrently with that request.
+    """
+
+    def __init__(self, interval: float, background_interval: float, slow_threshold: float,
+                 buffer_seconds: float, max_captures: int = 20, max_stacks: int = 50000):
+        self.interval = interval
+        self.background_interval = background_interval
+        self.slow_threshold = slow_threshold
+        self._recent = deque(maxlen=max(1, int(buffer_seconds / min(interval, background_interval))))
+        # Frame labels and whole stacks are interned, so each tick only stores
+        # references to tuples that were already built on an earlier tick.
+        self._labels = {}
+        self._stacks = {}
+        self.max_stacks = max_stacks
+        self._captures = deque(maxlen=max_captures)
+        self._session = None
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _session_open(self) -> bool:
+        return self._session is not None and not self._session['finished']
+
+    def _wanted(self) -> bool:
+        return self.slow_threshold > 0 or self._session_open()
+
+    def ensure_running(self):
+        with self._lock:
+            if self._thread is None and self._wanted():
+                self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+                self._thread.start()
+
+    def _stack(self, thread_name: str, frame) -> tuple:
+        # Leaf-first tuple of frame labels; fold_stacks reverses it
+        labels = []
+        while frame is not None:
+            code = frame.f_code
+            label = self._labels.get(code)
+            if label is None:
+                label = self._labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            labels.append(label)
+            frame = frame.f_back
+        labels.append(thread_name)
+        stack = tuple(labels)
+        interned = self._stacks.get(stack)
+        if interned is None:
+            if len(self._stacks) >= self.max_stacks:
+                self._stacks.clear()
+            interned = self._stacks[stack] = stack
+        return interned
+
+    def _run(self):
+        own_ident = threading.get_ident()
+        while True:
+            with self._lock:
+                if not self._wanted():
+                    self._thread = None
+                    return
+            now = time.perf_counter()
+            names = {t.ident: t.name for t in threading.enumerate()}
+            stacks = tuple(
+                self._stack(names.get(ident, str(ident)), frame)
+                for ident, frame in sys._current_frames().items()
+                if ident != own_ident
+            )
+            self._recent.append((now, stacks))
+            session = self._session
+            if session is not None and not session['finished']:
+                if now >= session['ends_at']:
+                    session['finished'] = True
+                elif session['route'] is None or self._inflight.get(session['route']):
+                    session['samples'] += 1
+                    session['stacks'].update(stacks)
+            time.sleep(self.interval if self._session_open() else self.background_interval)
+
+    def start_session(self, seconds: float, route: Optional[str] = None) -> dict:
+        if self._session_open():
+            raise HTTPException(status_code=409, detail='A profiling session is already running')
+        self._session = {
+            'route': route,
+            'seconds': seconds,
+            'started_at': datetime.now(timezone.utc).isoformat(),
+            'ends_at': time.perf_counter() + seconds,
+            'finished': False,
+            'samples': 0,
+            'stacks': StackCounter(),
+        }
+        self.ensure_running()
+        return self.status()
+
+    def stop_session(self):
+        if self._session is not None:
+            self._session['finished'] = True
+
+    def status(self) -> dict:
+        session = self._session
+        return {
+            'sampling': self._thread is not None,
+            'interval_seconds': self.interval,
+            'background_interval_seconds': self.background_interval,
+            'slow_request_threshold_seconds': self.slow_threshold or None,
+            'session': None if session is None else {
+                'route': session['route'],
+                'seconds': session['seconds'],
+                'started_at': session['started_at'],
+                'active': not session['finished'] and time.perf_counter() < session['ends_at'],
+                'samples': session['samples'],
+            },
+            'slow_captures': len(self._captures),
+        }
+
+    def session_profile(self) -> Optional[str]:
+        if self._session is None:
+            return None
+        return fold_stacks(self._session['stacks'])
+
+    def request_started(self, route: str):
+        self._inflight[route] = self._inflight.get(route, 0) + 1
+
+    def request_finished(self, method: str, route: str, started: float, finished: float):
+        self._inflight[route] -= 1
+        duration = finished - started
+        if not self.slow_threshold or duration < self.slow_threshold:
+            return
+        stacks = StackCounter()
+        samples = 0
+        for ts, tick in list(self._recent):
+            if started <= ts <= finished:
+                samples += 1
+                stacks.update(tick)
+        capture = {
+            'id': str(uuid.uuid4()),
+            'method': method,
+            'endpoint': route,
+            'duration_seconds': round(duration, 4),
+            'captured_at': datetime.now(timezone.utc).isoformat(),
+            'samples': samples,
+            'stacks': stacks,
+        }
+        self._captures.appendleft(capture)
+        logging.warning(f"Slow request {method} {route} took {duration:.2f}s, profile {capture['id']} captured")
+
+    def captures(self) -> List[dict]:
+        return [{k: v for k, v in c.items() if k != 'stacks'} for c in self._captures]
+
+    def capture_profile(self, capture_id: str) -> Optional[str]:
+        for capture in self._captures:
+            if capture['id'] == capture_id:
+                return fold_stacks(capture['stacks'])
+        return None
+
+profiler = SamplingProfiler(
+    PROFILE_SAMPLE_INTERVAL, PROFILE_BACKGROUND_INTERVAL, PROFILE_SLOW_REQUEST_SECONDS, PROFILE_BUFFER_SECONDS
+)
+
+# Startup and warm-up
+# lazy: import heavy modules on first use; background: warm up after the port is bound;
+# eager: warm up before the app starts accepting requests
+STARTUP_MODE = os.environ.get('STARTUP_MODE', 'background')
+HEAVY_MODULES = ('bcrypt', 'pdfplumber', 'google.generativeai')
+GEMINI_MODEL = os.environ.get('GEMINI_MODEL', 'gemini-2.0-flash-exp')
+
+STARTUP_SECONDS = Gauge('startup_seconds', 'Time from module import to the end of app startup')
+WARMUP_SECONDS = Gauge('warmup_seconds', 'Time spent pre-warming heavy modules and clients')
+MODULE_IMPORT_SECONDS = Gauge('module_import_seconds', 'Import time of lazily loaded modules', ['module'])
+
+IMPORT_TIMES = {}
+startup_state = {'mode': STARTUP_MODE, 'startup_seconds': None, 'warmup': 'pending', 'warmup_seconds': None, 'warmup_error': None}
+
+_generative_model = None
+_generative_model_lock = threading.Lock()
+
+def lazy_import(name: str):
+    """Import a heavy dependency on first use and record how long it took."""
+    if name in IMPORT_TIMES:
+        return sys.modules[name]
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    elapsed = IMPORT_TIMES.setdefault(name, round(time.perf_counter() - start, 4))
+    MODULE_IMPORT_SECONDS.labels(name).set(elapsed)
+    return module
+
+def get_generative_model():
+    """Configure the Gemini client once and reuse the model; None when no API key is set."""
+    global _generative_model
+    with _generative_model_lock:
+        if _generative_model is None:
+            api_key = os.environ.get('GEMINI_API_KEY', '')
+            if not api_key:
+                return None
+            genai = lazy_import('google.generativeai')
+            genai.configure(api_key=api_key)
+            _generative_model = genai.GenerativeModel(GEMINI_MODEL)
+        return _generative_model
+
+def warm_up_modules():
+    for name in HEAVY_MODULES:
+        lazy_import(name)
+    get_generative_model()
+
+async def warm_up():
+    startup_state['warmup'] = 'running'
+    start = time.perf_counter()
+    try:
+        await anyio.to_thread.run_sync(warm_up_modules)
+        try:
+            # Opens the first pooled connection so the first request doesn't pay for it
+            await asyncio.wait_for(client.admin.command('ping'), timeout=5)
+        except Exception as e:
+            logging.warning(f"MongoDB ping during warm-up failed: {e}")
+        startup_state['warmup'] = 'ready'
+    except Exception as e:
+        logging.error(f"Warm-up failed: {e}")
+        startup_state['warmup'] = 'failed'
+        startup_state['warmup_error'] = str(e)
+    startup_state['warmup_seconds'] = round(time.perf_counter() - start, 4)
+    WARMUP_SECONDS.set(startup_state['warmup_seconds'])
+
 # Models
 class UserRegister(BaseModel):
     email: EmailStr
@@ -53,6 +363,7 @@ class User(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     email: EmailStr
     name: str
+    is_admin: bool = False
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class Document(BaseModel):
@@ -68,6 +379,7 @@ class Document(BaseModel):
     page_count: int
     upload_date: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     text_content: Optional[str] = None
+    page_offsets: List[int] = Field(default_factory=list)  # start offset of each page in text_content
     status: str = 'processing'  # processing, ready, failed
 
 class ChatMessage(BaseModel):
@@ -88,12 +400,50 @@ class SearchRequest(BaseModel):
     company: Optional[str] = None
     industry: Optional[str] = None
 
+class SearchSnippet(BaseModel):
+    text: str
+    page: Optional[int] = None
+    highlights: List[List[int]]  # [start, end) offsets into text
+
+class SearchHit(BaseModel):
+    document_id: str
+    title: str
+    company: Optional[str] = None
+    industry: Optional[str] = None
+    page_count: int
+    upload_date: datetime
+    score: float
+    snippets: List[SearchSnippet] = []
+
+class DocumentDigest(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    document_id: str
+    user_id: str
+    status: str = 'processing'  # processing, ready, failed
+    source: Optional[str] = None  # model or extractive
+    summary: Optional[str] = None
+    risks: List[str] = []
+    figures: List[dict] = []  # {value, context, page}
+    tables: List[dict] = []  # {page, rows}
+    headings: List[dict] = []  # {text, page}
+    sections: List[str] = []  # model-written outline
+    key_figures: List[str] = []  # model-written, each with what it measures
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class ProfileRequest(BaseModel):
+    seconds: float = Field(default=30, gt=0, le=600)
+    route: Optional[str] = None  # route template, e.g. /api/chat/ask
+
 # Auth helpers
 def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    bcrypt = lazy_import('bcrypt')
+    with track_stage('auth.hash_password'):
+        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
 
 def verify_password(password: str, hashed: str) -> bool:
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+    bcrypt = lazy_import('bcrypt')
+    with track_stage('auth.verify_password'):
+        return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
 
 def create_token(user_id: str) -> str:
     expiration = datetime.now(timezone.utc) + timedelta(hours=JWT_EXPIRATION_HOURS)
@@ -107,7 +457,8 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         user_id = payload.get('user_id')
         if not user_id:
             raise HTTPException(status_code=401, detail='Invalid token')
-        user = await db.users.find_one({'id': user_id}, {'_id': 0, 'password_hash': 0})
+        with track_stage('auth.user_lookup'):
+            user = await db.users.find_one({'id': user_id}, {'_id': 0, 'password_hash': 0})
         if not user:
             raise HTTPException(status_code=401, detail='User not found')
         return User(**user)
@@ -116,11 +467,460 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail='Invalid token')
 
+async def get_admin_user(current_user: User = Depends(get_current_user)):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail='Admin access required')
+    return current_user
+
+# Rate limiting
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory')  # memory | mongo
+# Number of trusted reverse proxies in front of the app; each appends to X-Forwarded-For.
+# The default of 0 ignores the header, since without a proxy clients can set it themselves;
+# deployments behind an ingress opt in with their hop count.
+TRUSTED_PROXY_HOPS = int(os.environ.get('TRUSTED_PROXY_HOPS', '0'))
+# Burst capacity and refill rate (tokens per second) of each route class's bucket
+RATE_LIMITS = {
+    'auth': (10, 10 / 60),
+    'upload': (10, 10 / 600),
+    'search': (60, 1.0),
+    'ask': (10, 10 / 60),
+}
+DAILY_PAGE_QUOTA = int(os.environ.get('DAILY_PAGE_QUOTA', '2000'))
+DAILY_QUESTION_QUOTA = int(os.environ.get('DAILY_QUESTION_QUOTA', '200'))
+
+RATE_LIMITED = Counter('rate_limited_total', 'Requests rejected by rate limits and quotas', ['route_class'])
+
+class MemoryRateLimitBackend:
+    """Token buckets held in process memory; each worker enforces its own limits.
+
+    Buckets are kept in LRU order and capped at max_buckets. An evicted bucket
+    has been idle longest and simply starts full again when next used.
+    """
+
+    def __init__(self, max_buckets: int = 10000):
+        self.max_buckets = max_buckets
+        self._buckets = OrderedDict()
+
+    async def take(self, key: str, cost: float, capacity: float, refill_rate: float) -> float:
+        """Take cost tokens from the bucket; returns 0 when allowed, else seconds until it would be."""
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * refill_rate)
+        allowed = tokens >= cost
+        self._buckets[key] = (tokens - cost if allowed else tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_buckets:
+            self._buckets.popitem(last=False)
+        if allowed:
+            return 0.0
+        return (cost - tokens) / refill_rate
+
+class MongoRateLimitBackend:
+    """Token buckets shared by all workers, refilled and debited in one atomic update."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def take(self, key: str, cost: float, capacity: float, refill_rate: float) -> float:
+        now = time.time()
+        refilled = {'$min': [capacity, {'$add': [
+            {'$ifNull': ['$tokens', capacity]},
+            {'$multiply': [{'$max': [0, {'$subtract': [now, {'$ifNull': ['$updated', now]}]}]}, refill_rate]},
+        ]}]}
+        bucket = await self.collection.find_one_and_update(
+            {'_id': key},
+            [
+                {'$set': {'tokens': refilled, 'updated': now}},
+                {'$set': {'allowed': {'$gte': ['$tokens', cost]}}},
+                {'$set': {'tokens': {'$cond': ['$allowed', {'$subtract': ['$tokens', cost]}, '$tokens']}}},
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        if bucket['allowed']:
+            return 0.0
+        return (cost - bucket['tokens']) / refill_rate
+
+if RATE_LIMIT_BACKEND == 'mongo':
+    rate_limit_backend = MongoRateLimitBackend(db.rate_limits)
+else:
+    rate_limit_backend = MemoryRateLimitBackend()
+
+async def enforce_rate_limit(route_class: str, subject: str, cost: float = 1):
+    if not RATE_LIMIT_ENABLED:
+        return
+    capacity, refill_rate = RATE_LIMITS[route_class]
+    try:
+        retry_after = await rate_limit_backend.take(f"{route_class}:{subject}", cost, capacity, refill_rate)
+    except Exception as e:
+        # Fail open: a broken limiter backend should not take the API down with it
+        logging.error(f"Rate limit backend error: {e}")
+        return
+    if retry_after > 0:
+        RATE_LIMITED.labels(route_class).inc()
+        raise HTTPException(
+            status_code=429,
+            detail='Rate limit exceeded',
+            headers={'Retry-After': str(math.ceil(retry_after))}
+        )
+
+def rate_limit(route_class: str, cost: float = 1):
+    """Dependency limiting the current user's requests in a route class; cost reflects endpoint weight."""
+    async def check(current_user: User = Depends(get_current_user)):
+        await enforce_rate_limit(route_class, current_user.id, cost)
+    return check
+
+def client_address(request: Request) -> str:
+    if TRUSTED_PROXY_HOPS:
+        forwarded = [a.strip() for a in request.headers.get('x-forwarded-for', '').split(',') if a.strip()]
+        if forwarded:
+            # Entries left of the ones our proxies appended are client-supplied and can be forged
+            return forwarded[-min(TRUSTED_PROXY_HOPS, len(forwarded))]
+    return request.client.host if request.client else 'unknown'
+
+async def auth_rate_limit(request: Request):
+    # No user yet on auth routes, so limit by client address
+    await enforce_rate_limit('auth', client_address(request))
+
+# Daily quotas
+def usage_day() -> str:
+    return datetime.now(timezone.utc).date().isoformat()
+
+async def get_usage(user_id: str) -> dict:
+    usage = await db.usage.find_one({'user_id': user_id, 'day': usage_day()}, {'_id': 0})
+    return usage or {'user_id': user_id, 'day': usage_day(), 'pages_ingested': 0, 'questions_asked': 0}
+
+def quota_exceeded(field: str, quota: int, route_class: str) -> HTTPException:
+    RATE_LIMITED.labels(route_class).inc()
+    return HTTPException(status_code=429, detail=f"Daily quota exceeded ({quota} {field.replace('_', ' ')})")
+
+async def check_quota(user_id: str, field: str, quota: int, route_class: str, amount: int = 1):
+    # Read-only early exit; reserve_quota is what actually enforces the quota
+    usage = await get_usage(user_id)
+    if usage.get(field, 0) + amount > quota:
+        raise quota_exceeded(field, quota, route_class)
+
+async def reserve_quota(user_id: str, field: str, quota: int, route_class: str, amount: int = 1):
+    """Count amount against today's usage in one atomic update, or raise 429 if it would pass the quota."""
+    if amount > quota:
+        raise quota_exceeded(field, quota, route_class)
+    for _ in range(2):
+        try:
+            await db.usage.find_one_and_update(
+                {
+                    'user_id': user_id,
+                    'day': usage_day(),
+                    '$or': [{field: {'$lte': quota - amount}}, {field: {'$exists': False}}],
+                },
+                {'$inc': {field: amount}},
+                upsert=True
+            )
+            return
+        except DuplicateKeyError:
+            # Today's row exists without room, so the upsert collided with it. Retry once in
+            # case the row was only just created by a concurrent first request of the day.
+            continue
+    raise quota_exceeded(field, quota, route_class)
+
+async def release_quota(user_id: str, field: str, amount: int = 1):
+    # Hands back a reservation whose request failed
+    await db.usage.update_one({'user_id': user_id, 'day': usage_day()}, {'$inc': {field: -amount}})
+
+# Search index
+TERM_PATTERN = re.compile(r'\w{2,}')
+MAX_TERM_POSITIONS = 20  # per term per document; enough for snippets, keeps index rows small
+SNIPPET_RADIUS = 80
+SNIPPETS_PER_HIT = 3
+TITLE_MATCH_BOOST = 10
+SEARCH_RESULT_LIMIT = 50
+
+def build_term_index(text: str) -> dict:
+    """Map each lowercased term to its occurrence count and first character offsets."""
+    terms = {}
+    for match in TERM_PATTERN.finditer(text):
+        entry = terms.setdefault(match.group().lower(), {'count': 0, 'positions': []})
+        entry['count'] += 1
+        if len(entry['positions']) < MAX_TERM_POSITIONS:
+            entry['positions'].append(match.start())
+    return terms
+
+async def index_document(document_id: str, user_id: str, text: str):
+    terms = build_term_index(text)
+    await db.search_terms.delete_many({'document_id': document_id})
+    if terms:
+        await db.search_terms.insert_many([
+            {'document_id': document_id, 'user_id': user_id, 'term': term, **entry}
+            for term, entry in terms.items()
+        ])
+    await db.documents.update_one({'id': document_id}, {'$set': {'search_indexed': True}})
+
+async def ensure_search_index(user_id: str):
+    # Documents uploaded before term indexing existed are indexed on their first search
+    pending = await db.documents.find(
+        {'user_id': user_id, 'search_indexed': {'$ne': True}},
+        {'_id': 0, 'id': 1, 'text_content': 1}
+    ).to_list(100)
+    for doc in pending:
+        await index_document(doc['id'], user_id, doc.get('text_content') or '')
+
+def build_snippets(text: str, matches: List[tuple], page_offsets: List[int]) -> List[dict]:
+    """Cut windows around (offset, length) matches, merging matches that share a window."""
+    snippets = []
+    current = None
+    for offset, length in sorted(matches):
+        if current and offset + length <= current['end']:
+            current['highlights'].append([offset, offset + length])
+            continue
+        if len(snippets) == SNIPPETS_PER_HIT:
+            break
+        current = {
+            'start': max(0, offset - SNIPPET_RADIUS),
+            'end': min(len(text), offset + length + SNIPPET_RADIUS),
+            'page': bisect_right(page_offsets, offset) or None,
+            'highlights': [[offset, offset + length]],
+        }
+        snippets.append(current)
+    return [
+        {
+            'text': text[s['start']:s['end']].replace('\n', ' '),
+            'page': s['page'],
+            'highlights': [[a - s['start'], b - s['start']] for a, b in s['highlights']],
+        }
+        for s in snippets
+    ]
+
+# Document digests
+DIGEST_ENABLED = os.environ.get('DIGEST_ENABLED', 'true').lower() == 'true'
+DIGEST_CLAIM_TIMEOUT = timedelta(minutes=10)  # a build still 'processing' after this is presumed dead
+MAX_DIGEST_HEADINGS = 30
+MAX_DIGEST_FIGURES = 25
+MAX_DIGEST_TABLES = 10
+MAX_TABLE_ROWS = 20
+
+DIGEST_ANSWERS = Counter('digest_answers_total', 'Questions answered from a stored digest', ['intent'])
+
+NUMBERED_HEADING = re.compile(r'^\d+(\.\d+)*\.?\s+[A-Z]')
+FIGURE_PATTERN = re.compile(
+    r'(?:[$€£₹]|\b(?:USD|EUR|GBP|INR|Rs\.?))\s?\d[\d,]*(?:\.\d+)?(?:\s?(?:billion|million|thousand|crore|lakh|bn|mn)\b)?'
+    r'|\b\d[\d,]*(?:\.\d+)?\s?%'
+    r'|\b\d[\d,]*(?:\.\d+)?\s(?:billion|million|crore|lakh)\b',
+    re.IGNORECASE
+)
+SENTENCE_SPLIT = re.compile(r'(?<=[.!?])\s+')
+PAGE_LABEL = re.compile(r'^(page\s*)?\d+(\s*(of|/)\s*\d+)?$', re.IGNORECASE)
+LABELLED_VALUE = re.compile(r'^[^:]{1,40}:\s*\S')
+DOT_LEADER = re.compile(r'\.{3,}\s*\d+$')
+
+# Questions are lowercased and stripped of punctuation before a full match,
+# so only plainly generic questions skip the model
+_DOC = r'( in| of| from| for)?( this| the)?( document| report| pdf| file| company)?'
+DIGEST_INTENTS = {
+    'summary': re.compile(
+        r'(please |can you )?(summari[sz]e|give( me)?( a| an)?( brief| short| quick)? (summary|overview)( of)?|(summary|overview)( of)?|tl;?dr)'
+        r'( this| the)?( document| report| pdf| file)?( please)?'
+        r'|what is( this| the) (document|report|pdf|file) about'
+    ),
+    'figures': re.compile(
+        r'(what are |show |list |give me )?(the )?(key |main |important |major |headline )?'
+        r'(financial (figures|numbers|metrics|highlights)|figures|numbers|metrics|financials)' + _DOC
+    ),
+    'risks': re.compile(
+        r'(what are |list |show )?(the )?(key |main |major |primary |top |biggest )?(risks|risk factors)'
+        r'( mentioned| discussed| identified| highlighted)?' + _DOC
+    ),
+    'outline': re.compile(
+        r'(what are |list |show )?(the )?(main |key )?(sections|headings|outline|table of contents|structure)' + _DOC
+    ),
+}
+
+def is_heading(line: str) -> bool:
+    if not 3 <= len(line) <= 80 or line.endswith(('.', ',', ';', ':')):
+        return False
+    # Page footers, "Label: value" fields and table-of-contents entries look like titles but are not sections
+    if PAGE_LABEL.match(line) or LABELLED_VALUE.match(line) or DOT_LEADER.search(line):
+        return False
+    if sum(c.isalpha() for c in line) < 3:
+        return False
+    words = line.split()
+    return (
+        line.isupper()
+        or bool(NUMBERED_HEADING.match(line))
+        or (len(words) <= 8 and all(w[0].isupper() or not w[0].isalpha() for w in words))
+    )
+
+def extract_digest_structure(file_path: str, text: str, page_offsets: List[int]) -> dict:
+    """Pull candidate headings, numbers and tables out of an extracted document.
+
+    These are heuristic and only shown alongside the document; chat answers use
+    the model-written sections and key figures instead.
+    """
+    lines, pages_by_line = [], {}
+    offset = 0
+    for line in text.split('\n'):
+        stripped = line.strip()
+        page = bisect_right(page_offsets, offset) or None
+        lines.append((stripped, page))
+        # Digits are masked so numbered running headers and footers count as one line
+        pages_by_line.setdefault(re.sub(r'\d+', '#', stripped), set()).add(page)
+        offset += len(line) + 1
+    
+    def repeats(line: str) -> bool:
+        return len(page_offsets) >= 3 and len(pages_by_line[re.sub(r'\d+', '#', line)]) > len(page_offsets) / 2
+    
+    headings, figures, seen = [], [], set()
+    for stripped, page in lines:
+        if not stripped or repeats(stripped):
+            continue
+        if stripped not in seen and is_heading(stripped):
+            seen.add(stripped)
+            headings.append({'text': stripped, 'page': page})
+        if DOT_LEADER.search(stripped):
+            continue
+        for match in FIGURE_PATTERN.finditer(stripped):
+            figures.append({'value': match.group().strip(), 'context': stripped[:160], 'page': page})
+    
+    tables = []
+    try:
+        pdfplumber = lazy_import('pdfplumber')
+        with pdfplumber.open(file_path) as pdf:
+            for number, page in enumerate(pdf.pages[:50], start=1):
+                for table in page.extract_tables():
+                    rows = [[cell or '' for cell in row] for row in table[:MAX_TABLE_ROWS]]
+                    if rows:
+                        tables.append({'page': number, 'rows': rows})
+                if len(tables) >= MAX_DIGEST_TABLES:
+                    break
+    except Exception as e:
+        logging.error(f"Error extracting PDF tables: {e}")
+    
+    return {
+        'headings': headings[:MAX_DIGEST_HEADINGS],
+        'figures': figures[:MAX_DIGEST_FIGURES],
+        'tables': tables[:MAX_DIGEST_TABLES],
+    }
+
+def summarize_with_model(model, title: str, text: str) -> dict:
+    prompt = (
+        f"You are a research assistant. Read the document titled '{title}' and respond with JSON of the form "
+        '{"summary": "<one paragraph summary>", "risks": ["<main risk>", ...], '
+        '"sections": ["<section title>", ...], "key_figures": ["<figure>: <what it measures>", ...]}. '
+        "List at most 10 risks, 30 sections and 15 key figures, and only ones the document states."
+    )
+    response = model.generate_content(
+        [prompt, text[:30000]],
+        generation_config={'response_mime_type': 'application/json'}
+    )
+    data = json.loads(response.text)
+    def strings(key, limit):
+        return [str(v).strip() for v in data.get(key) or [] if str(v).strip()][:limit]
+    
+    return {
+        'summary': str(data.get('summary') or '').strip() or None,
+        'risks': strings('risks', 10),
+        'sections': strings('sections', MAX_DIGEST_HEADINGS),
+        'key_figures': strings('key_figures', 15),
+    }
+
+def extractive_summary(text: str) -> dict:
+    # Used when no model is configured or the model call fails
+    sentences = [s for s in SENTENCE_SPLIT.split(' '.join(text.split())) if len(s.split()) >= 6]
+    return {
+        'summary': ' '.join(sentences[:3]) or None,
+        'risks': [s for s in sentences if 'risk' in s.lower()][:5],
+    }
+
+async def build_digest(document_id: str, user_id: str):
+    doc = await db.documents.find_one({'id': document_id, 'user_id': user_id}, {'_id': 0})
+    if not doc:
+        return
+    try:
+        with track_stage('digest.build'):
+            text = doc.get('text_content') or ''
+            structure = await anyio.to_thread.run_sync(
+                extract_digest_structure, doc['file_path'], text, doc.get('page_offsets') or []
+            )
+            overview, source = None, 'extractive'
+            model = await anyio.to_thread.run_sync(get_generative_model)
+            if model is not None:
+                try:
+                    overview = await anyio.to_thread.run_sync(summarize_with_model, model, doc['title'], text)
+                    source = 'model'
+                except Exception as e:
+                    logging.error(f"Error summarizing document with Gemini: {e}")
+            if overview is None:
+                overview = extractive_summary(text)
+        
+        digest = DocumentDigest(
+            document_id=document_id,
+            user_id=user_id,
+            status='ready',
+            source=source,
+            **overview,
+            **structure
+        )
+        digest_dict = digest.model_dump()
+        digest_dict['created_at'] = digest_dict['created_at'].isoformat()
+        await db.digests.replace_one({'document_id': document_id}, digest_dict, upsert=True)
+    except Exception as e:
+        logging.error(f"Error building digest: {e}")
+        await db.digests.update_one({'document_id': document_id}, {'$set': {'status': 'failed'}})
+
+async def schedule_digest(background_tasks: BackgroundTasks, document_id: str, user_id: str) -> bool:
+    """Claim the digest build and queue it, unless another build holds a live claim.
+
+    Missing and failed digests can be claimed, as can 'processing' claims older
+    than DIGEST_CLAIM_TIMEOUT, whose worker most likely died mid-build.
+    """
+    now = datetime.now(timezone.utc)
+    stale = (now - DIGEST_CLAIM_TIMEOUT).isoformat()
+    try:
+        await db.digests.update_one(
+            {
+                'document_id': document_id,
+                '$or': [
+                    {'status': 'failed'},
+                    {'status': 'processing', 'claimed_at': {'$lt': stale}},
+                    {'status': 'processing', 'claimed_at': {'$exists': False}},
+                ],
+            },
+            {'$set': {'document_id': document_id, 'user_id': user_id, 'status': 'processing', 'claimed_at': now.isoformat()}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # The digest is ready or a live build holds the claim; the upsert could not insert over it
+        return False
+    background_tasks.add_task(build_digest, document_id, user_id)
+    return True
+
+def match_digest_intent(question: str) -> Optional[str]:
+    normalized = ' '.join(re.sub(r'[^\w\s;]', ' ', question.lower()).split())
+    for intent, pattern in DIGEST_INTENTS.items():
+        if pattern.fullmatch(normalized):
+            return intent
+    return None
+
+def format_digest_answer(digest: dict, intent: str) -> Optional[str]:
+    # Extractive summaries and heuristic headings/figures are fine to display but too rough
+    # to answer with, so questions only short-circuit the model when the model wrote the digest
+    if digest.get('source') != 'model':
+        return None
+    if intent == 'summary' and digest.get('summary'):
+        return digest['summary']
+    if intent == 'figures' and digest.get('key_figures'):
+        return 'Key figures in the document:\n' + '\n'.join(f"- {f}" for f in digest['key_figures'])
+    if intent == 'risks' and digest.get('risks'):
+        return 'Main risks identified in the document:\n' + '\n'.join(f"- {r}" for r in digest['risks'])
+    if intent == 'outline' and digest.get('sections'):
+        return 'Sections of the document:\n' + '\n'.join(f"- {h}" for h in digest['sections'])
+    return None
+
 # Auth routes
-@api_router.post("/auth/register")
+@api_router.post("/auth/register", dependencies=[Depends(auth_rate_limit)])
 async def register(user_data: UserRegister):
     # Check if user exists
-    existing = await db.users.find_one({'email': user_data.email}, {'_id': 0})
+    with track_stage('auth.user_lookup'):
+        existing = await db.users.find_one({'email': user_data.email}, {'_id': 0})
     if existing:
         raise HTTPException(status_code=400, detail='Email already registered')
     
@@ -130,14 +930,16 @@ async def register(user_data: UserRegister):
     doc['password_hash'] = hash_password(user_data.password)
     doc['created_at'] = doc['created_at'].isoformat()
     
-    await db.users.insert_one(doc)
+    with track_stage('auth.user_insert'):
+        await db.users.insert_one(doc)
     token = create_token(user.id)
     
     return {'token': token, 'user': user.model_dump()}
 
-@api_router.post("/auth/login")
+@api_router.post("/auth/login", dependencies=[Depends(auth_rate_limit)])
 async def login(user_data: UserLogin):
-    user_doc = await db.users.find_one({'email': user_data.email}, {'_id': 0})
+    with track_stage('auth.user_lookup'):
+        user_doc = await db.users.find_one({'email': user_data.email}, {'_id': 0})
     if not user_doc:
         raise HTTPException(status_code=401, detail='Invalid credentials')
     
@@ -154,8 +956,9 @@ async def get_me(current_user: User = Depends(get_current_user)):
     return current_user
 
 # Document routes
-@api_router.post("/documents/upload")
+@api_router.post("/documents/upload", dependencies=[Depends(rate_limit('upload'))])
 async def upload_document(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     title: Optional[str] = None,
     company: Optional[str] = None,
@@ -166,13 +969,15 @@ async def upload_document(
     if not file.filename.lower().endswith('.pdf'):
         raise HTTPException(status_code=400, detail='Only PDF files are supported')
     
+    await check_quota(current_user.id, 'pages_ingested', DAILY_PAGE_QUOTA, 'upload')
+    
     # Save file
     file_id = str(uuid.uuid4())
     file_ext = Path(file.filename).suffix
     filename = f"{file_id}{file_ext}"
     file_path = UPLOAD_DIR / filename
     
-    with file_path.open('wb') as buffer:
+    with track_stage('upload.save'), file_path.open('wb') as buffer:
         shutil.copyfileobj(file.file, buffer)
     
     # Get file size
@@ -181,16 +986,26 @@ async def upload_document(
     # Extract text and count pages
     text_content = ''
     page_count = 0
+    page_offsets = []
     try:
-        with pdfplumber.open(file_path) as pdf:
+        pdfplumber = lazy_import('pdfplumber')
+        with track_stage('upload.extract'), pdfplumber.open(file_path) as pdf:
             page_count = len(pdf.pages)
             for page in pdf.pages[:50]:  # Limit to first 50 pages for performance
+                page_offsets.append(len(text_content))
                 text = page.extract_text()
                 if text:
                     text_content += text + '\n\n'
     except Exception as e:
         logging.error(f"Error extracting PDF text: {e}")
     
+    # The page count is only known now, so reserve the full amount before storing anything
+    try:
+        await reserve_quota(current_user.id, 'pages_ingested', DAILY_PAGE_QUOTA, 'upload', amount=page_count)
+    except HTTPException:
+        file_path.unlink(missing_ok=True)
+        raise
+    
     # Create document
     doc = Document(
         user_id=current_user.id,
@@ -202,17 +1017,29 @@ async def upload_document(
         file_size=file_size,
         page_count=page_count,
         text_content=text_content[:50000],  # Limit stored text
+        page_offsets=page_offsets,
         status='ready' if text_content else 'failed'
     )
     
     doc_dict = doc.model_dump()
     doc_dict['upload_date'] = doc_dict['upload_date'].isoformat()
     
-    await db.documents.insert_one(doc_dict)
+    try:
+        with track_stage('upload.insert'):
+            await db.documents.insert_one(doc_dict)
+        with track_stage('upload.index'):
+            await index_document(doc.id, current_user.id, doc.text_content or '')
+    except Exception:
+        await release_quota(current_user.id, 'pages_ingested', page_count)
+        raise
+    
+    # Digest is built after the response is sent
+    if DIGEST_ENABLED and doc.status == 'ready':
+        await schedule_digest(background_tasks, doc.id, current_user.id)
     
     return doc.model_dump()
 
-@api_router.get("/documents", response_model=List[Document])
+@api_router.get("/documents", response_model=List[Document], dependencies=[Depends(rate_limit('search'))])
 async def get_documents(
     company: Optional[str] = None,
     industry: Optional[str] = None,
@@ -224,7 +1051,10 @@ async def get_documents(
     if industry:
         query['industry'] = {'$regex': industry, '$options': 'i'}
     
-    docs = await db.documents.find(query, {'_id': 0}).sort('upload_date', -1).to_list(100)
+    # Full text stays server-side; the library only needs metadata
+    docs = await db.documents.find(
+        query, {'_id': 0, 'text_content': 0, 'page_offsets': 0}
+    ).sort('upload_date', -1).to_list(100)
     
     for doc in docs:
         if isinstance(doc['upload_date'], str):
@@ -246,31 +1076,132 @@ async def get_document(
     
     return Document(**doc)
 
-@api_router.post("/documents/search")
+# Term lookups are indexed, but snippet building still reads each hit's stored text
+@api_router.post("/documents/search", response_model=List[SearchHit], dependencies=[Depends(rate_limit('search', cost=2))])
 async def search_documents(
     search: SearchRequest,
     current_user: User = Depends(get_current_user)
 ):
     query = {'user_id': current_user.id}
-    
-    if search.query:
-        query['$or'] = [
-            {'title': {'$regex': search.query, '$options': 'i'}},
-            {'text_content': {'$regex': search.query, '$options': 'i'}}
-        ]
-    
     if search.company:
         query['company'] = {'$regex': search.company, '$options': 'i'}
     if search.industry:
         query['industry'] = {'$regex': search.industry, '$options': 'i'}
     
-    docs = await db.documents.find(query, {'_id': 0}).sort('upload_date', -1).to_list(50)
+    terms = list(dict.fromkeys(t.lower() for t in TERM_PATTERN.findall(search.query or '')))
+    scores = {}
+    matches = {}
+    if search.query:
+        await ensure_search_index(current_user.id)
+        
+        term_filter = None
+        if terms:
+            # Whole-word match on every term except the last, which is matched as a prefix
+            # so results keep up while the last word is still being typed
+            exact_terms, last_term = terms[:-1], terms[-1]
+            if any(t.startswith(last_term) for t in exact_terms):
+                # An earlier whole word already satisfies the prefix
+                terms = exact_terms
+                term_filter = {'user_id': current_user.id, 'term': {'$in': exact_terms}}
+            else:
+                term_filter = {
+                    'user_id': current_user.id,
+                    '$or': [{'term': {'$in': exact_terms}}, {'term': {'$regex': f"^{re.escape(last_term)}"}}]
+                }
+            # Scored per document in Mongo so no term rows are dropped on the way
+            term_scores = await db.search_terms.aggregate([
+                {'$match': term_filter},
+                {'$group': {
+                    '_id': '$document_id',
+                    'score': {'$sum': '$count'},
+                    # Rows outside exact_terms can only have come from the prefix clause
+                    'matched': {'$addToSet': {'$cond': [{'$in': ['$term', exact_terms]}, '$term', last_term]}},
+                }},
+                # Every query term has to appear in the text
+                {'$match': {'matched': {'$size': len(terms)}}},
+            ]).to_list(None)
+            scores = {row['_id']: row['score'] for row in term_scores}
+        
+        title_pattern = {'$regex': re.escape(search.query), '$options': 'i'}
+        title_hits = await db.documents.find(
+            {**query, '$or': [{'title': title_pattern}, {'company': title_pattern}]},
+            {'_id': 0, 'id': 1}
+        ).to_list(None)
+        for doc in title_hits:
+            scores[doc['id']] = scores.get(doc['id'], 0) + TITLE_MATCH_BOOST
+        
+        if not scores:
+            return []
+        
+        # Rank every candidate that passes the filters, then load only the top results
+        candidates = await db.documents.find(
+            {**query, 'id': {'$in': list(scores)}},
+            {'_id': 0, 'id': 1, 'upload_date': 1}
+        ).to_list(None)
+        candidates.sort(key=lambda doc: (scores[doc['id']], str(doc['upload_date'])), reverse=True)
+        ranked_ids = [doc['id'] for doc in candidates[:SEARCH_RESULT_LIMIT]]
+        query = {'user_id': current_user.id, 'id': {'$in': ranked_ids}}
+        
+        if term_filter:
+            term_rows = await db.search_terms.find(
+                {**term_filter, 'document_id': {'$in': ranked_ids}},
+                {'_id': 0, 'document_id': 1, 'term': 1, 'positions': 1}
+            ).to_list(None)
+            for row in term_rows:
+                matches.setdefault(row['document_id'], []).extend((p, len(row['term'])) for p in row['positions'])
+    
+    projection = {'_id': 0, 'id': 1, 'title': 1, 'company': 1, 'industry': 1, 'page_count': 1, 'upload_date': 1}
+    if matches:
+        projection.update({'text_content': 1, 'page_offsets': 1})
+    docs = await db.documents.find(query, projection).sort('upload_date', -1).to_list(SEARCH_RESULT_LIMIT)
     
+    hits = []
     for doc in docs:
         if isinstance(doc['upload_date'], str):
             doc['upload_date'] = datetime.fromisoformat(doc['upload_date'])
+        snippets = []
+        if doc['id'] in matches:
+            snippets = build_snippets(doc.get('text_content') or '', matches[doc['id']], doc.get('page_offsets') or [])
+        hits.append(SearchHit(
+            document_id=doc['id'],
+            title=doc['title'],
+            company=doc.get('company'),
+            industry=doc.get('industry'),
+            page_count=doc['page_count'],
+            upload_date=doc['upload_date'],
+            score=scores.get(doc['id'], 0),
+            snippets=snippets
+        ))
     
-    return docs
+    if search.query:
+        order = {doc_id: i for i, doc_id in enumerate(ranked_ids)}
+        hits.sort(key=lambda hit: order[hit.document_id])
+    return hits
+
+@api_router.get("/documents/{document_id}/digest", response_model=DocumentDigest)
+async def get_document_digest(
+    document_id: str,
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(get_current_user)
+):
+    doc = await db.documents.find_one({'id': document_id, 'user_id': current_user.id}, {'_id': 0, 'status': 1})
+    if not doc:
+        raise HTTPException(status_code=404, detail='Document not found')
+    
+    digest = await db.digests.find_one({'document_id': document_id}, {'_id': 0})
+    if not digest or digest.get('status') != 'ready':
+        # Documents uploaded before digests existed get one on first view; failed
+        # and abandoned builds are retried the same way
+        can_build = DIGEST_ENABLED and doc.get('status') == 'ready'
+        if can_build and await schedule_digest(background_tasks, document_id, current_user.id):
+            return DocumentDigest(document_id=document_id, user_id=current_user.id)
+        if not digest:
+            raise HTTPException(status_code=404, detail='Digest not available')
+    
+    if isinstance(digest.get('created_at'), str):
+        digest['created_at'] = datetime.fromisoformat(digest['created_at'])
+    
+    return DocumentDigest(**digest)
 
 @api_router.delete("/documents/{document_id}")
 async def delete_document(
@@ -289,72 +1220,86 @@ async def delete_document(
     # Delete from database
     await db.documents.delete_one({'id': document_id})
     await db.chats.delete_many({'document_id': document_id})
+    await db.search_terms.delete_many({'document_id': document_id})
+    await db.digests.delete_many({'document_id': document_id})
     
     return {'message': 'Document deleted successfully'}
 
 # AI Chat routes
-@api_router.post("/chat/ask")
-async def ask_question(
-    request: QuestionRequest,
-    current_user: User = Depends(get_current_user)
-):
-    # Get document
-    doc = await db.documents.find_one({'id': request.document_id, 'user_id': current_user.id}, {'_id': 0})
-    if not doc:
-        raise HTTPException(status_code=404, detail='Document not found')
+async def save_chat_message(document_id: str, user_id: str, role: str, content: str):
+    msg = ChatMessage(document_id=document_id, user_id=user_id, role=role, content=content)
+    msg_dict = msg.model_dump()
+    msg_dict['timestamp'] = msg_dict['timestamp'].isoformat()
+    with track_stage(f'ask.insert_{role}_message'):
+        await db.chats.insert_one(msg_dict)
+
+async def answer_question(doc: dict, user_id: str, question: str) -> dict:
+    # Common questions are answered from the stored digest without a model round trip
+    intent = match_digest_intent(question) if DIGEST_ENABLED else None
+    if intent:
+        with track_stage('ask.digest_lookup'):
+            digest = await db.digests.find_one({'document_id': doc['id'], 'status': 'ready'}, {'_id': 0})
+        digest_answer = format_digest_answer(digest, intent) if digest else None
+        if digest_answer:
+            await save_chat_message(doc['id'], user_id, 'user', question)
+            await save_chat_message(doc['id'], user_id, 'assistant', digest_answer)
+            DIGEST_ANSWERS.labels(intent).inc()
+            return {'answer': digest_answer, 'source': 'digest'}
     
-    # Initialize Gemini
-    api_key = os.environ.get('GEMINI_API_KEY', '')
-    if not api_key:
+    # Gemini is configured once per process and the model reused across asks; the first
+    # call imports the SDK under a lock, so it runs off the event loop
+    model = await anyio.to_thread.run_sync(get_generative_model)
+    if model is None:
         raise HTTPException(status_code=500, detail='Gemini API key not configured')
-    
-    genai.configure(api_key=api_key)
+    genai = lazy_import('google.generativeai')
     
     # Save user message
-    user_msg = ChatMessage(
-        document_id=request.document_id,
-        user_id=current_user.id,
-        role='user',
-        content=request.question
-    )
-    user_msg_dict = user_msg.model_dump()
-    user_msg_dict['timestamp'] = user_msg_dict['timestamp'].isoformat()
-    await db.chats.insert_one(user_msg_dict)
+    await save_chat_message(doc['id'], user_id, 'user', question)
     
     # Get response from Gemini
     try:
         # Upload the PDF file to Gemini
-        uploaded_file = genai.upload_file(doc['file_path'])
-        
-        # Create model and generate response
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
+        with track_stage('ask.upload'):
+            uploaded_file = genai.upload_file(doc['file_path'])
         
         system_prompt = f"You are a research assistant analyzing documents. The document title is '{doc['title']}'. Provide accurate, detailed answers based on the document content."
         
-        response = model.generate_content([
-            system_prompt,
-            uploaded_file,
-            request.question
-        ])
+        with track_stage('ask.generate'):
+            response = model.generate_content([
+                system_prompt,
+                uploaded_file,
+                question
+            ])
         
         answer_text = response.text
         
         # Save assistant message
-        assistant_msg = ChatMessage(
-            document_id=request.document_id,
-            user_id=current_user.id,
-            role='assistant',
-            content=answer_text
-        )
-        assistant_msg_dict = assistant_msg.model_dump()
-        assistant_msg_dict['timestamp'] = assistant_msg_dict['timestamp'].isoformat()
-        await db.chats.insert_one(assistant_msg_dict)
+        await save_chat_message(doc['id'], user_id, 'assistant', answer_text)
         
         return {'answer': answer_text}
     except Exception as e:
         logging.error(f"Error calling Gemini: {e}")
         raise HTTPException(status_code=500, detail=f"Error processing question: {str(e)}")
 
+@api_router.post("/chat/ask", dependencies=[Depends(rate_limit('ask'))])
+async def ask_question(
+    request: QuestionRequest,
+    current_user: User = Depends(get_current_user)
+):
+    # Get document
+    with track_stage('ask.doc_lookup'):
+        doc = await db.documents.find_one({'id': request.document_id, 'user_id': current_user.id}, {'_id': 0})
+    if not doc:
+        raise HTTPException(status_code=404, detail='Document not found')
+    
+    await reserve_quota(current_user.id, 'questions_asked', DAILY_QUESTION_QUOTA, 'ask')
+    try:
+        return await answer_question(doc, current_user.id, request.question)
+    except Exception:
+        # Questions that could not be answered do not count against the quota
+        await release_quota(current_user.id, 'questions_asked')
+        raise
+
 @api_router.get("/chat/{document_id}", response_model=List[ChatMessage])
 async def get_chat_history(
     document_id: str,
@@ -389,6 +1334,7 @@ async def get_stats(current_user: User = Depends(get_current_user)):
     industries = await db.documents.distinct('industry', {'user_id': current_user.id, 'industry': {'$ne': None}})
     
     total_chats = await db.chats.count_documents({'user_id': current_user.id})
+    usage = await get_usage(current_user.id)
     
     return {
         'total_documents': total_docs,
@@ -397,25 +1343,102 @@ async def get_stats(current_user: User = Depends(get_current_user)):
         'total_industries': len(industries),
         'total_queries': total_chats // 2,  # Divide by 2 (user + assistant messages)
         'companies': companies[:10],
-        'industries': industries[:10]
+        'industries': industries[:10],
+        'usage_today': {
+            'pages_ingested': usage.get('pages_ingested', 0),
+            'questions_asked': usage.get('questions_asked', 0),
+            'page_quota': DAILY_PAGE_QUOTA,
+            'question_quota': DAILY_QUESTION_QUOTA
+        }
     }
 
 @api_router.get("/analytics/recent")
 async def get_recent_activity(current_user: User = Depends(get_current_user)):
     recent_docs = await db.documents.find(
         {'user_id': current_user.id},
-        {'_id': 0, 'title': 1, 'upload_date': 1, 'page_count': 1, 'company': 1}
+        {'_id': 0, 'id': 1, 'title': 1, 'upload_date': 1, 'page_count': 1, 'company': 1}
     ).sort('upload_date', -1).limit(5).to_list(5)
     
+    digests = await db.digests.find(
+        {'document_id': {'$in': [doc['id'] for doc in recent_docs]}, 'status': 'ready'},
+        {'_id': 0, 'document_id': 1, 'summary': 1}
+    ).to_list(5)
+    summaries = {d['document_id']: d.get('summary') for d in digests}
+    
     for doc in recent_docs:
         if isinstance(doc['upload_date'], str):
             doc['upload_date'] = datetime.fromisoformat(doc['upload_date'])
+        doc['summary'] = summaries.get(doc['id'])
     
     return {'recent_documents': recent_docs}
 
+# Health routes
+@api_router.get("/health/live")
+async def liveness():
+    return {'status': 'alive'}
+
+@api_router.get("/health/ready")
+async def readiness():
+    ready = startup_state['warmup'] in ('ready', 'skipped')
+    body = {**startup_state, 'ready': ready, 'import_times': IMPORT_TIMES}
+    return JSONResponse(body, status_code=200 if ready else 503)
+
+# Admin profiling routes
+@api_router.post("/admin/profiler/start")
+async def start_profiler(request: ProfileRequest, admin: User = Depends(get_admin_user)):
+    return profiler.start_session(request.seconds, request.route)
+
+@api_router.post("/admin/profiler/stop")
+async def stop_profiler(admin: User = Depends(get_admin_user)):
+    profiler.stop_session()
+    return profiler.status()
+
+@api_router.get("/admin/profiler/status")
+async def get_profiler_status(admin: User = Depends(get_admin_user)):
+    return profiler.status()
+
+@api_router.get("/admin/profiler/profile", response_class=PlainTextResponse)
+async def get_profile(admin: User = Depends(get_admin_user)):
+    folded = profiler.session_profile()
+    if folded is None:
+        raise HTTPException(status_code=404, detail='No profiling session has been run')
+    return folded
+
+@api_router.get("/admin/profiler/slow")
+async def get_slow_captures(admin: User = Depends(get_admin_user)):
+    return {'threshold_seconds': profiler.slow_threshold or None, 'captures': profiler.captures()}
+
+@api_router.get("/admin/profiler/slow/{capture_id}", response_class=PlainTextResponse)
+async def get_slow_capture(capture_id: str, admin: User = Depends(get_admin_user)):
+    folded = profiler.capture_profile(capture_id)
+    if folded is None:
+        raise HTTPException(status_code=404, detail='Capture not found')
+    return folded
+
+# Metrics routes
+@app.get("/metrics")
+async def metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 # Include router
 app.include_router(api_router)
 
+@app.middleware("http")
+async def instrument_requests(request: Request, call_next):
+    endpoint = route_template(request)
+    start = time.perf_counter()
+    status_code = 500
+    profiler.request_started(endpoint)
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        finished = time.perf_counter()
+        profiler.request_finished(request.method, endpoint, start, finished)
+        REQUEST_COUNT.labels(request.method, endpoint, status_code).inc()
+        REQUEST_LATENCY.labels(request.method, endpoint, status_code).observe(finished - start)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -431,6 +1454,40 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def start_event_loop_monitor():
+    app.state.loop_monitor = asyncio.create_task(monitor_event_loop())
+    profiler.ensure_running()
+
+@app.on_event("startup")
+async def ensure_indexes():
+    async def create():
+        try:
+            await db.search_terms.create_index([('user_id', 1), ('term', 1)])
+            await db.search_terms.create_index('document_id')
+            # Every ask reads digests by document_id; unique also stops duplicate builds
+            await db.digests.create_index('document_id', unique=True)
+            # reserve_quota relies on upserts colliding with today's existing usage row
+            await db.usage.create_index([('user_id', 1), ('day', 1)], unique=True)
+        except Exception as e:
+            logging.warning(f"Could not create indexes: {e}")
+    # In the background so an unreachable MongoDB doesn't hold up startup
+    app.state.ensure_indexes = asyncio.create_task(create())
+
+@app.on_event("startup")
+async def start_warm_up():
+    if STARTUP_MODE == 'eager':
+        await warm_up()
+    elif STARTUP_MODE == 'background':
+        # uvicorn binds the port once startup handlers return, so this runs behind live traffic
+        app.state.warm_up = asyncio.create_task(warm_up())
+    else:
+        startup_state['warmup'] = 'skipped'
+    startup_state['startup_seconds'] = round(time.perf_counter() - BOOT_STARTED, 4)
+    STARTUP_SECONDS.set(startup_state['startup_seconds'])
+    logger.info(f"Startup ({STARTUP_MODE}) completed in {startup_state['startup_seconds']}s")
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    app.state.loop_monitor.cancel()
     client.close()
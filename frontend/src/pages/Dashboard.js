@@ -140,6 +140,9 @@ export default function Dashboard() {
                         <p className="text-sm text-zinc-600">
                           {doc.page_count} pages • {doc.company || 'No company'}
                         </p>
+                        {doc.summary && (
+                          <p className="text-xs text-zinc-500 mt-1 line-clamp-2">{doc.summary}</p>
+                        )}
                       </div>
                     </div>
                     <p className="text-sm text-zinc-600 font-mono">
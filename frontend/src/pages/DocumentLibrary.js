@@ -1,4 +1,4 @@
-import { useEffect, useState, useCallback } from 'react';
+import { useEffect, useState, useCallback, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
 import axios from 'axios';
 import { toast } from 'sonner';
@@ -31,6 +31,8 @@ export default function DocumentLibrary() {
   });
   
   const [searchQuery, setSearchQuery] = useState('');
+  const [searchHits, setSearchHits] = useState(null);
+  const searchSeq = useRef(0);
   const [companyFilter, setCompanyFilter] = useState('all');
   const [industryFilter, setIndustryFilter] = useState('all');
 
@@ -38,9 +40,16 @@ export default function DocumentLibrary() {
     fetchDocuments();
   }, []);
 
+  useEffect(() => {
+    if (!searchQuery.trim()) {
+      searchSeq.current += 1;
+      setSearchHits(null);
+    }
+  }, [searchQuery]);
+
   useEffect(() => {
     filterDocuments();
-  }, [documents, searchQuery, companyFilter, industryFilter]);
+  }, [documents, searchHits, companyFilter, industryFilter]);
 
   const fetchDocuments = async () => {
     try {
@@ -56,14 +65,37 @@ export default function DocumentLibrary() {
     }
   };
 
+  // Searches run on submit; each one is rate limited server-side
+  const searchDocuments = async (e) => {
+    e.preventDefault();
+    if (!searchQuery.trim()) return;
+
+    const seq = ++searchSeq.current;
+    try {
+      const token = localStorage.getItem('token');
+      const response = await axios.post(`${API}/documents/search`, { query: searchQuery }, {
+        headers: { Authorization: `Bearer ${token}` }
+      });
+      // Ignore responses that arrive after a newer search or a cleared query
+      if (seq === searchSeq.current) {
+        setSearchHits(response.data);
+      }
+    } catch (error) {
+      if (seq === searchSeq.current) {
+        toast.error(error.response?.data?.detail || 'Search failed');
+      }
+    }
+  };
+
   const filterDocuments = () => {
     let filtered = [...documents];
 
-    if (searchQuery) {
-      filtered = filtered.filter(doc =>
-        doc.title.toLowerCase().includes(searchQuery.toLowerCase()) ||
-        doc.company?.toLowerCase().includes(searchQuery.toLowerCase())
-      );
+    if (searchHits) {
+      // Hits arrive ranked; keep that order and attach their snippets
+      const byId = Object.fromEntries(documents.map(doc => [doc.id, doc]));
+      filtered = searchHits
+        .filter(hit => byId[hit.document_id])
+        .map(hit => ({ ...byId[hit.document_id], snippets: hit.snippets }));
     }
 
     if (companyFilter !== 'all') {
@@ -143,6 +175,18 @@ export default function DocumentLibrary() {
     }
   };
 
+  const renderSnippet = (snippet) => {
+    const parts = [];
+    let cursor = 0;
+    snippet.highlights.forEach(([start, end], i) => {
+      parts.push(snippet.text.slice(cursor, start));
+      parts.push(<mark key={i} className="bg-primary/20 text-zinc-950 rounded-sm">{snippet.text.slice(start, end)}</mark>);
+      cursor = end;
+    });
+    parts.push(snippet.text.slice(cursor));
+    return parts;
+  };
+
   const companies = [...new Set(documents.filter(d => d.company).map(d => d.company))];
   const industries = [...new Set(documents.filter(d => d.industry).map(d => d.industry))];
 
@@ -249,17 +293,17 @@ export default function DocumentLibrary() {
             <div className="grid grid-cols-1 md:grid-cols-3 gap-4">
               <div className="space-y-2">
                 <Label htmlFor="search">Search</Label>
-                <div className="relative">
+                <form onSubmit={searchDocuments} className="relative">
                   <Search className="absolute left-3 top-1/2 transform -translate-y-1/2 w-4 h-4 text-zinc-400" />
                   <Input
                     id="search"
-                    placeholder="Search documents..."
+                    placeholder="Search documents and press Enter..."
                     value={searchQuery}
                     onChange={(e) => setSearchQuery(e.target.value)}
                     className="pl-10"
                     data-testid="search-input"
                   />
-                </div>
+                </form>
               </div>
               <div className="space-y-2">
                 <Label htmlFor="company-filter">Company</Label>
@@ -348,6 +392,16 @@ export default function DocumentLibrary() {
                   <div className="mt-2 text-xs text-zinc-500 font-mono">
                     {new Date(doc.upload_date).toLocaleDateString()}
                   </div>
+                  {doc.snippets?.length > 0 && (
+                    <div className="mt-4 space-y-2" data-testid={`search-snippets-${doc.id}`}>
+                      {doc.snippets.map((snippet, i) => (
+                        <p key={i} className="text-xs text-zinc-600 leading-relaxed">
+                          {snippet.page && <span className="font-mono text-zinc-400 mr-1">p.{snippet.page}</span>}
+                          …{renderSnippet(snippet)}…
+                        </p>
+                      ))}
+                    </div>
+                  )}
                 </CardContent>
               </Card>
             ))}
@@ -17,6 +17,7 @@ export default function DocumentViewer() {
   const navigate = useNavigate();
   const [document, setDocument] = useState(null);
   const [chatHistory, setChatHistory] = useState([]);
+  const [digest, setDigest] = useState(null);
   const [question, setQuestion] = useState('');
   const [loading, setLoading] = useState(true);
   const [asking, setAsking] = useState(false);
@@ -24,6 +25,7 @@ export default function DocumentViewer() {
   useEffect(() => {
     fetchDocument();
     fetchChatHistory();
+    fetchDigest();
   }, [id]);
 
   const fetchDocument = async () => {
@@ -53,6 +55,19 @@ export default function DocumentViewer() {
     }
   };
 
+  const fetchDigest = async () => {
+    try {
+      const token = localStorage.getItem('token');
+      const response = await axios.get(`${API}/documents/${id}/digest`, {
+        headers: { Authorization: `Bearer ${token}` }
+      });
+      setDigest(response.data);
+    } catch (error) {
+      // Digests are optional; the page works without one
+      setDigest(null);
+    }
+  };
+
   const handleAskQuestion = async (e) => {
     e.preventDefault();
     if (!question.trim()) return;
@@ -168,6 +183,46 @@ export default function DocumentViewer() {
                 </div>
               </CardContent>
             </Card>
+
+            {digest?.status === 'ready' && (
+              <Card className="border-zinc-200 mt-6" data-testid="document-digest">
+                <CardHeader>
+                  <CardTitle>Digest</CardTitle>
+                </CardHeader>
+                <CardContent className="space-y-4 text-sm">
+                  {digest.summary && <p className="text-zinc-700 leading-relaxed">{digest.summary}</p>}
+                  {digest.headings.length > 0 && (
+                    <div>
+                      <p className="font-medium text-zinc-950 mb-1">Sections</p>
+                      <ul className="space-y-1">
+                        {digest.headings.slice(0, 8).map((heading, i) => (
+                          <li key={i} className="flex justify-between gap-2 text-zinc-600">
+                            <span className="truncate">{heading.text}</span>
+                            {heading.page && <span className="font-mono text-xs">p.{heading.page}</span>}
+                          </li>
+                        ))}
+                      </ul>
+                    </div>
+                  )}
+                  {digest.figures.length > 0 && (
+                    <div>
+                      <p className="font-medium text-zinc-950 mb-1">Key figures</p>
+                      <div className="flex flex-wrap gap-2">
+                        {digest.figures.slice(0, 10).map((figure, i) => (
+                          <span
+                            key={i}
+                            title={figure.context}
+                            className="font-mono text-xs px-2 py-1 rounded bg-primary/10 text-zinc-950"
+                          >
+                            {figure.value}
+                          </span>
+                        ))}
+                      </div>
+                    </div>
+                  )}
+                </CardContent>
+              </Card>
+            )}
           </div>
 
           {/* AI Chat */}
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# server.py lives in backend/ and loads backend/.env on import
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
@@ -0,0 +1,94 @@
+import pytest
+
+from server import extract_digest_structure, format_digest_answer, is_heading, match_digest_intent, summarize_with_model
+
+
+@pytest.mark.parametrize('question, intent', [
+    ('Summarize this document', 'summary'),
+    ('Can you give me a brief overview of the report?', 'summary'),
+    ('TL;DR', 'summary'),
+    ('What is this document about?', 'summary'),
+    ('What are the key financial figures?', 'figures'),
+    ('Show the main metrics in this report', 'figures'),
+    ('What are the main risks mentioned in the document?', 'risks'),
+    ('List risk factors', 'risks'),
+    ('What are the main sections of this document?', 'outline'),
+    ('table of contents', 'outline'),
+])
+def test_generic_questions_match_an_intent(question, intent):
+    assert match_digest_intent(question) == intent
+
+
+@pytest.mark.parametrize('question', [
+    'What was revenue growth in 2023?',
+    'Summarize the risks in the Asia segment',
+    'Why did margins fall?',
+    'What are the figures for Q3 only?',
+    '',
+])
+def test_specific_questions_go_to_the_model(question):
+    assert match_digest_intent(question) is None
+
+
+def test_extractive_digests_never_answer():
+    digest = {
+        'source': 'extractive',
+        'summary': 'First sentences.',
+        'risks': ['Currency risk.'],
+        'headings': [{'text': 'Overview', 'page': 1}],
+        'figures': [{'value': '12%', 'context': 'Contents 12%', 'page': 1}],
+    }
+    for intent in ('summary', 'risks', 'outline', 'figures'):
+        assert format_digest_answer(digest, intent) is None
+
+
+def test_model_digests_answer_from_model_fields():
+    digest = {
+        'source': 'model',
+        'summary': 'A summary.',
+        'sections': ['Overview', 'Results'],
+        'key_figures': ['$4.5 million: revenue'],
+        'headings': [{'text': 'Page 3', 'page': 3}],
+    }
+    assert format_digest_answer(digest, 'summary') == 'A summary.'
+    assert format_digest_answer(digest, 'outline') == 'Sections of the document:\n- Overview\n- Results'
+    assert format_digest_answer(digest, 'figures') == 'Key figures in the document:\n- $4.5 million: revenue'
+    assert format_digest_answer(digest, 'risks') is None
+
+
+@pytest.mark.parametrize('line', ['Page 3', 'page 4 of 12', '7', 'Company: Test Corp', 'Introduction ........ 3'])
+def test_footers_fields_and_contents_entries_are_not_headings(line):
+    assert not is_heading(line)
+
+
+@pytest.mark.parametrize('line', ['RISK FACTORS', '2.1 Revenue Recognition', 'Market Overview'])
+def test_title_lines_are_headings(line):
+    assert is_heading(line)
+
+
+def test_running_headers_are_dropped_from_structure(tmp_path):
+    pages = [f"Acme Annual Report {n}\nSection {name}\nRevenue rose 12% this year" for n, name in
+             enumerate(['Alpha', 'Beta', 'Gamma'], start=1)]
+    text, offsets = '', []
+    for page in pages:
+        offsets.append(len(text))
+        text += page + '\n\n'
+    structure = extract_digest_structure(str(tmp_path / 'missing.pdf'), text, offsets)
+    assert [h['text'] for h in structure['headings']] == ['Section Alpha', 'Section Beta', 'Section Gamma']
+    assert [h['page'] for h in structure['headings']] == [1, 2, 3]
+
+
+def test_model_response_is_normalised():
+    class Response:
+        text = '{"summary": " A summary. ", "risks": ["Currency", ""], "sections": ["Overview"], "key_figures": null}'
+
+    class Model:
+        def generate_content(self, parts, generation_config):
+            return Response()
+
+    assert summarize_with_model(Model(), 'Report', 'text') == {
+        'summary': 'A summary.',
+        'risks': ['Currency'],
+        'sections': ['Overview'],
+        'key_figures': [],
+    }
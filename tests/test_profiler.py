@@ -0,0 +1,101 @@
+import sys
+import time
+from collections import Counter
+
+import pytest
+from fastapi import HTTPException
+
+from server import SamplingProfiler, fold_stacks
+
+
+def make_profiler(slow_threshold=0.0):
+    return SamplingProfiler(0.005, 0.01, slow_threshold, buffer_seconds=5)
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_fold_stacks_writes_root_first_most_common_first():
+    stacks = Counter({('leaf (a.py:1)', 'main (a.py:9)', 'MainThread'): 2, ('idle (b.py:3)', 'worker'): 5})
+    assert fold_stacks(stacks) == 'worker;idle (b.py:3) 5\nMainThread;main (a.py:9);leaf (a.py:1) 2'
+
+
+def test_identical_stacks_are_interned():
+    profiler = make_profiler()
+
+    def sample():
+        return profiler._stack('MainThread', sys._getframe())
+
+    first, second = sample(), sample()
+    assert first is second
+    assert first[-1] == 'MainThread'
+    assert first[0].startswith('sample (test_profiler.py:')
+
+
+def test_session_samples_until_it_expires():
+    profiler = make_profiler()
+    profiler.start_session(0.1)
+    with pytest.raises(HTTPException) as exc:
+        profiler.start_session(0.1)
+    assert exc.value.status_code == 409
+
+    assert wait_for(lambda: not profiler.status()['sampling'])
+    session = profiler.status()['session']
+    assert not session['active']
+    assert session['samples'] > 0
+    assert 'MainThread;' in profiler.session_profile()
+
+
+def test_route_filtered_session_only_samples_while_route_is_in_flight():
+    profiler = make_profiler()
+    profiler.start_session(5, route='/api/chat/ask')
+    try:
+        time.sleep(0.1)
+        assert profiler.status()['session']['samples'] == 0
+
+        profiler.request_started('/api/chat/ask')
+        assert wait_for(lambda: profiler.status()['session']['samples'] > 0)
+        profiler.request_finished('POST', '/api/chat/ask', time.perf_counter(), time.perf_counter())
+    finally:
+        profiler.stop_session()
+    assert wait_for(lambda: not profiler.status()['sampling'])
+
+
+def test_slow_request_capture_uses_ticks_inside_the_request_window():
+    profiler = make_profiler(slow_threshold=1.0)
+    before, during, after = ('before', 'T'), ('during', 'T'), ('after', 'T')
+    profiler._recent.extend([(9.0, (before,)), (10.5, (during,)), (11.5, (during,)), (13.0, (after,))])
+
+    profiler.request_started('/api/documents/upload')
+    profiler.request_finished('POST', '/api/documents/upload', started=10.0, finished=12.0)
+
+    [capture] = profiler.captures()
+    assert capture['endpoint'] == '/api/documents/upload'
+    assert capture['duration_seconds'] == 2.0
+    assert capture['samples'] == 2
+    assert profiler.capture_profile(capture['id']) == 'T;during 2'
+    assert profiler.capture_profile('missing') is None
+
+
+def test_fast_requests_are_not_captured():
+    profiler = make_profiler(slow_threshold=1.0)
+    profiler._recent.append((10.5, (('during', 'T'),)))
+    profiler.request_started('/api/documents')
+    profiler.request_finished('GET', '/api/documents', started=10.0, finished=10.9)
+    assert profiler.captures() == []
+
+
+def test_background_sampling_runs_only_while_capture_is_enabled():
+    profiler = make_profiler(slow_threshold=1.0)
+    profiler.ensure_running()
+    assert wait_for(lambda: len(profiler._recent) > 0)
+    assert profiler.status()['sampling']
+
+    profiler.slow_threshold = 0
+    assert wait_for(lambda: not profiler.status()['sampling'])
@@ -0,0 +1,45 @@
+import asyncio
+
+from server import MemoryRateLimitBackend
+
+SLOW_REFILL = 1 / 60  # one token a minute, so nothing refills during a test
+
+
+def take(backend, key, cost=1, capacity=2):
+    return asyncio.run(backend.take(key, cost, capacity, SLOW_REFILL))
+
+
+def test_allows_up_to_capacity_then_reports_retry_after():
+    backend = MemoryRateLimitBackend()
+    assert take(backend, 'user:1') == 0
+    assert take(backend, 'user:1') == 0
+    retry_after = take(backend, 'user:1')
+    assert 59 < retry_after <= 60
+
+
+def test_cost_above_remaining_tokens_is_rejected_without_debit():
+    backend = MemoryRateLimitBackend()
+    assert take(backend, 'user:1', cost=2, capacity=3) == 0
+    assert take(backend, 'user:1', cost=2, capacity=3) > 0
+    # The rejected request did not spend the last token
+    assert take(backend, 'user:1', cost=1, capacity=3) == 0
+
+
+def test_buckets_are_independent_per_key():
+    backend = MemoryRateLimitBackend()
+    take(backend, 'user:1', cost=2)
+    assert take(backend, 'user:1') > 0
+    assert take(backend, 'user:2') == 0
+
+
+def test_least_recently_used_bucket_is_evicted():
+    backend = MemoryRateLimitBackend(max_buckets=2)
+    take(backend, 'a', cost=2)
+    take(backend, 'b', cost=2)
+    take(backend, 'a')  # rejected, but marks a as recently used
+    take(backend, 'c')
+
+    assert len(backend._buckets) == 2
+    # a kept its empty bucket; b was evicted and starts full again
+    assert take(backend, 'a') > 0
+    assert take(backend, 'b', cost=2) == 0
@@ -0,0 +1,50 @@
+from server import MAX_TERM_POSITIONS, SNIPPET_RADIUS, SNIPPETS_PER_HIT, build_snippets, build_term_index
+
+
+def test_term_index_counts_lowercased_terms_with_offsets():
+    terms = build_term_index('Revenue grew. revenue, REVENUE and a cost')
+    assert terms['revenue'] == {'count': 3, 'positions': [0, 14, 23]}
+    assert terms['cost'] == {'count': 1, 'positions': [37]}
+
+
+def test_term_index_skips_single_characters():
+    assert 'a' not in build_term_index('a cost')
+
+
+def test_term_index_caps_positions_but_not_count():
+    terms = build_term_index('risk ' * (MAX_TERM_POSITIONS + 5))
+    assert terms['risk']['count'] == MAX_TERM_POSITIONS + 5
+    assert len(terms['risk']['positions']) == MAX_TERM_POSITIONS
+
+
+def test_snippet_highlights_are_relative_to_snippet_text():
+    text = 'x' * 200 + ' revenue ' + 'y' * 200
+    [snippet] = build_snippets(text, [(201, 7)], [0])
+    start, end = snippet['highlights'][0]
+    assert snippet['text'][start:end] == 'revenue'
+    assert len(snippet['text']) == 7 + 2 * SNIPPET_RADIUS
+
+
+def test_nearby_matches_share_a_snippet():
+    text = 'revenue and cost ' + 'z' * 400
+    [snippet] = build_snippets(text, [(12, 4), (0, 7)], [0])
+    assert [snippet['text'][a:b] for a, b in snippet['highlights']] == ['revenue', 'cost']
+
+
+def test_snippets_report_the_page_of_their_first_match():
+    page_one = 'revenue ' + 'a' * 300 + '\n\n'
+    text = page_one + 'revenue ' + 'b' * 300
+    snippets = build_snippets(text, [(0, 7), (len(page_one), 7)], [0, len(page_one)])
+    assert [s['page'] for s in snippets] == [1, 2]
+    assert '\n' not in snippets[0]['text']
+
+
+def test_snippets_without_page_offsets_have_no_page():
+    [snippet] = build_snippets('revenue', [(0, 7)], [])
+    assert snippet['page'] is None
+
+
+def test_snippets_are_capped_per_hit():
+    text = ' '.join(['revenue' + ' ' * 400] * (SNIPPETS_PER_HIT + 2))
+    matches = [(m, 7) for m in range(0, len(text), 408)]
+    assert len(build_snippets(text, matches, [0])) == SNIPPETS_PER_HIT